@@ -0,0 +1,68 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+HOST = '127.0.0.1'
+PORT = 8050
+URL = f'http://{HOST}:{PORT}/'
+
+
+def build(onedir):
+    env = dict(os.environ, DASHBOARD_ONEDIR='1' if onedir else '0')
+    subprocess.run([sys.executable, '-m', 'PyInstaller', '--noconfirm', 'DashBoardCRM.spec'], check=True, env=env)
+
+
+def executable_path(onedir):
+    name = 'DashBoardCRM.exe' if os.name == 'nt' else 'DashBoardCRM'
+    if onedir:
+        return os.path.join('dist', 'DashBoardCRM', name)
+    return os.path.join('dist', name)
+
+
+def ensure_port_free():
+    # Un serveur déjà lancé répondrait à la place de l'exécutable mesuré et fausserait le temps.
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        if sock.connect_ex((HOST, PORT)) == 0:
+            raise RuntimeError(f"Le port {PORT} est déjà utilisé : arrêtez l'autre instance avant de mesurer")
+
+
+def measure_startup(command, timeout=120):
+    # Temps entre le lancement du processus et la première réponse HTTP du serveur Dash.
+    ensure_port_free()
+    start = time.perf_counter()
+    process = subprocess.Popen(command)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Le processus s'est arrêté (code {process.returncode}) avant de répondre")
+            try:
+                with urllib.request.urlopen(URL, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"Aucune réponse de {URL} après {timeout} s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Construit DashBoardCRM et mesure son temps de démarrage.")
+    parser.add_argument('--onedir', action='store_true', help="build en dossier (démarrage rapide, sans extraction)")
+    parser.add_argument('--skip-build', action='store_true', help="mesure uniquement l'exécutable déjà construit")
+    parser.add_argument('--runs', type=int, default=3, help="nombre de lancements mesurés")
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        build(args.onedir)
+    executable = executable_path(args.onedir)
+    timings = [measure_startup([executable]) for _ in range(args.runs)]
+    print(f"Démarrage de {executable} : " + ", ".join(f"{t:.2f} s" for t in timings))
+    print(f"Premier lancement : {timings[0]:.2f} s, meilleur : {min(timings):.2f} s")
@@ -1,21 +1,32 @@
 import dash
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
+from dash import dcc, html, dash_table, Patch
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+import numpy as np
 import pandas as pd
 import base64
+import hashlib
 import io
-import plotly.express as px
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
+# Exécutable PyInstaller : les processus de lecture des classeurs relancent ce script.
+multiprocessing.freeze_support()
+
 
 external_stylesheets = ['https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500&display=swap']
 
 app = dash.Dash(__name__,
                 suppress_callback_exceptions=True,
                 external_stylesheets=external_stylesheets)
-
-df = pd.DataFrame()
-df_agenda = pd.DataFrame()
+server = app.server
 
 COLORS = {
     'background': '#f8f9fa',
@@ -51,6 +62,26 @@ LOADING_STYLE = {
     'zIndex': 9999
 }
 
+_px = None
+
+def get_px():
+    # plotly.express est lourd à importer : on le charge au premier graphique
+    # (ou en arrière-plan au démarrage) pour que la page réponde tout de suite.
+    global _px
+    if _px is None:
+        import plotly.express
+        _px = plotly.express
+    return _px
+
+def warm_up_modules():
+    start = time.perf_counter()
+    get_px()
+    try:
+        import openpyxl  # moteur Excel utilisé par pd.read_excel
+    except ImportError:
+        pass
+    print(f"Modules préchargés en {time.perf_counter() - start:.2f} s", flush=True)
+
 def regrouper_autres(df, colonne_categorie, colonne_valeur, seuil=1):
     total = df[colonne_valeur].sum()
     df["Pourcentage"] = (df[colonne_valeur] / total) * 100
@@ -60,14 +91,326 @@ def regrouper_autres(df, colonne_categorie, colonne_valeur, seuil=1):
         df_filtre = pd.concat([df_filtre, pd.DataFrame({colonne_categorie: ["Autres"], colonne_valeur: [autres]})])
     return df_filtre[[colonne_categorie, colonne_valeur]]
 
-def parse_contents(contents):
+def decode_contents(contents):
     content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    return pd.read_excel(io.BytesIO(decoded))
+    return base64.b64decode(content_string)
+
+def parse_contents(contents):
+    return read_workbook(decode_contents(contents))
+
+def read_workbook(source):
+    # source : contenu du classeur (bytes) ou chemin. Appelée aussi dans les processus de lecture.
+    return pd.read_excel(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+DATE_COLUMNS = ['Created At', 'Approved Date', 'Task Completed Date', 'Order Completed Date',
+                'Waiting for PO At', 'In Work At', 'Wf. Part At(H)', 'Suspension At']
+
+# (colonne, seuil rouge, seuil orange) en jours, par ordre de priorité : la première date renseignée décide.
+URGENCY_RULES = [
+    ('Order Completed Date', 30, 15),
+    ('Task Completed Date', 30, 15),
+    ('In Work At', 14, 7),
+    ('Suspension At', 30, 15),
+    ('Wf. Part At(H)', 14, 7),
+    ('Waiting for PO At', 30, 15),
+    ('Created At', 30, 15),
+]
+
+# openpyxl est en Python pur et garde le GIL : plusieurs classeurs ne sont lus en parallèle
+# que dans des processus séparés.
+PARSE_WORKERS = int(os.environ.get('DASHBOARD_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+ORDERS_CACHE_SIZE = 4
+AGGREGATES_CACHE_SIZE = 64
+_orders_cache = {}
+_orders_loading = {}
+_period_index_cache = {}
+_aggregates_cache = {}
+_index_cache = {}
+_cache_lock = threading.Lock()
+
+WATCH_DIR = os.environ.get('DASHBOARD_WATCH_DIR')
+WATCH_INTERVAL = float(os.environ.get('DASHBOARD_WATCH_INTERVAL', '30'))
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+UPLOAD_DIR = os.environ.get('DASHBOARD_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'DashBoardCRM-uploads'))
+UPLOAD_RETENTION_DAYS = 7
+_published = {'orders_key': None, 'orders': None, 'agenda': None, 'updated_at': None, 'skipped': {}}
+_published_lock = threading.Lock()
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+def source_name(filename, index):
+    if filename:
+        return os.path.splitext(os.path.basename(filename))[0]
+    return f"Fichier {index + 1}"
+
+def cache_put(cache, key, value, size):
+    with _cache_lock:
+        while len(cache) >= size:
+            cache.pop(next(iter(cache)))
+        cache[key] = value
+
+def get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+def read_workbooks(sources):
+    # Renvoie, dans l'ordre, le DataFrame de chaque classeur ou l'exception levée en le lisant.
+    # Un seul classeur (ou un seul processeur) est lu sur place, sans le coût d'un processus.
+    global _parse_pool
+    if len(sources) > 1 and PARSE_WORKERS > 1:
+        pool = get_parse_pool()
+        try:
+            futures = [pool.submit(read_workbook, source) for source in sources]
+            results = [future.exception() or future.result() for future in futures]
+        except BrokenProcessPool as e:
+            results = [e]
+        if not any(isinstance(result, BrokenProcessPool) for result in results):
+            return results
+        # Un processus de lecture est mort : le pool sera recréé au prochain appel, lecture sur place.
+        with _parse_pool_lock:
+            if _parse_pool is pool:
+                _parse_pool = None
+    results = []
+    for source in sources:
+        try:
+            results.append(read_workbook(source))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def urgency_colors(df):
+    today = pd.Timestamp(datetime.today().date())
+    colors = pd.Series('', index=df.index, dtype=object)
+    decided = pd.Series(False, index=df.index)
+    for col, red_days, orange_days in URGENCY_RULES:
+        present = df[col].notna() & ~decided
+        days = (today - df[col].dt.normalize()).dt.days
+        colors[present & (days >= red_days)] = 'red'
+        colors[present & (days < red_days) & (days >= orange_days)] = 'orange'
+        decided |= present
+    return colors
+
+def combine_orders(frames, sources):
+    for source, frame in zip(sources, frames):
+        frame['Source'] = source
+    combined = pd.concat(frames, ignore_index=True)
+    if 'Order No.' in combined.columns:
+        # Les lignes sans numéro de commande ne sont pas des doublons entre elles : on les garde toutes.
+        duplicated = combined['Order No.'].notna() & combined.duplicated(subset='Order No.', keep='last')
+        combined = combined[~duplicated].reset_index(drop=True)
+    for col in DATE_COLUMNS:
+        if col in combined.columns:
+            combined[col] = pd.to_datetime(combined[col], errors='coerce')
+    if all(col in combined.columns for col, _, _ in URGENCY_RULES):
+        combined['Color'] = urgency_colors(combined)
+    return combined
+
+def orders_key(contents, filenames):
+    # L'urgence dépend de la date du jour : la clé change chaque jour pour recalculer les agrégats.
+    contents = as_list(contents)
+    filenames = as_list(filenames)
+    digest = hashlib.sha1(datetime.today().date().isoformat().encode())
+    for i, content in enumerate(contents):
+        digest.update(source_name(filenames[i] if i < len(filenames) else None, i).encode())
+        digest.update(content.encode())
+    return digest.hexdigest()
+
+def load_orders(contents, filenames=None):
+    # Un classeur par agence : lecture en parallèle (processus séparés) puis fusion avec une colonne 'Source'.
+    # Le résultat est mis en cache pour que les changements de filtre ne relisent aucun fichier.
+    contents = as_list(contents)
+    filenames = as_list(filenames)
+    key = orders_key(contents, filenames)
+    with _cache_lock:
+        if key in _orders_cache:
+            return key, _orders_cache[key]
+        loading = _orders_loading.setdefault(key, threading.Lock())
+
+    # Plusieurs callbacks (ou sessions) peuvent demander les mêmes fichiers en même temps :
+    # un seul les lit, les autres attendent le résultat en cache.
+    try:
+        with loading:
+            with _cache_lock:
+                combined = _orders_cache.get(key)
+            if combined is None:
+                sources = [source_name(filenames[i] if i < len(filenames) else None, i) for i in range(len(contents))]
+                frames = read_workbooks([decode_contents(content) for content in contents])
+                for frame in frames:
+                    if isinstance(frame, Exception):
+                        raise frame
+                combined = combine_orders(frames, sources)
+                cache_put(_orders_cache, key, combined, ORDERS_CACHE_SIZE)
+    finally:
+        with _cache_lock:
+            _orders_loading.pop(key, None)
+    return key, combined
+
+def upload_path(key):
+    return os.path.join(UPLOAD_DIR, f"{key}.json")
+
+def spool_upload(key, contents, filenames):
+    # Copie disque des fichiers déposés : un jeu sorti du cache mémoire (dépôts d'autres sessions)
+    # est relu depuis cette copie au lieu de demander un nouveau dépôt.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = upload_path(key)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'contents': as_list(contents), 'filenames': as_list(filenames)}, f)
+        os.replace(tmp_path, path)
+    expired = time.time() - UPLOAD_RETENTION_DAYS * 86400
+    for entry in os.scandir(UPLOAD_DIR):
+        try:
+            if entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def published_store():
+    # Les fichiers ignorés font partie du store : la page ouverte affiche leur liste dès qu'elle change.
+    with _published_lock:
+        key = _published['orders_key']
+        skipped = sorted(os.path.basename(path) for path in _published['skipped'])
+    if key is None and not skipped:
+        return None
+    return {'key': key, 'source': 'watch', 'skipped': skipped}
+
+def resolve_orders(store):
+    # 'stored-data' ne contient que la clé du jeu : fichiers déposés (en cache), sinon le jeu publié.
+    if not store:
+        return None, None
+    if 'error' in store:
+        raise ValueError(store['error'])
+    if store['source'] == 'watch':
+        with _published_lock:
+            return _published['orders_key'], _published['orders']
+    with _cache_lock:
+        orders = _orders_cache.get(store['key'])
+    if orders is not None:
+        return store['key'], orders
+    try:
+        with open(upload_path(store['key'])) as f:
+            upload = json.load(f)
+    except OSError:
+        raise ValueError("les données ne sont plus disponibles, veuillez recharger le fichier")
+    return load_orders(upload['contents'], upload['filenames'])
+
+def published_agenda():
+    with _published_lock:
+        return _published['agenda']
+
+def scan_watch_dir(directory):
+    files = {}
+    for entry in os.scandir(directory):
+        name = entry.name
+        if entry.is_file() and name.lower().endswith(EXCEL_EXTENSIONS) and not name.startswith('~$'):
+            stat = entry.stat()
+            files[entry.path] = (stat.st_mtime, stat.st_size)
+    return files
+
+def watch_file_problem(path, frame):
+    # Même contrôle que pour un dépôt (orders_dataset) : un export incomplet est écarté,
+    # les autres fichiers du dossier restent publiés.
+    if isinstance(frame, Exception):
+        return str(frame)
+    if 'agenda' in os.path.basename(path).lower():
+        return None
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in frame.columns]
+    if missing_columns:
+        return f"colonnes manquantes : {', '.join(missing_columns)}"
+    return None
+
+def publish_watch_frames(frames):
+    # frames : {chemin: (signature, DataFrame)} des fichiers lisibles.
+    # Les fichiers dont le nom contient "agenda" alimentent l'onglet 3, les autres sont des exports de commandes.
+    orders_paths = sorted(path for path in frames if 'agenda' not in os.path.basename(path).lower())
+    agenda_paths = sorted((path for path in frames if 'agenda' in os.path.basename(path).lower()),
+                          key=lambda path: frames[path][0][0])
+
+    orders, key = None, None
+    if orders_paths:
+        # combine_orders ajoute la colonne 'Source' : on travaille sur des copies des DataFrames en cache.
+        orders = combine_orders([frames[path][1].copy() for path in orders_paths],
+                                [source_name(path, i) for i, path in enumerate(orders_paths)])
+        digest = hashlib.sha1(datetime.today().date().isoformat().encode())
+        for path in orders_paths:
+            digest.update(f"{path}:{frames[path][0]}".encode())
+        key = 'watch:' + digest.hexdigest()
+        prewarm_orders(key, orders)
+    agenda = frames[agenda_paths[-1]][1] if agenda_paths else None
+
+    with _published_lock:
+        _published.update(orders_key=key, orders=orders, agenda=agenda, updated_at=datetime.now())
+
+def prewarm_orders(key, orders):
+    # Index des périodes et agrégats de l'onglet 1 pour les sélections par défaut,
+    # calculés hors requête pour que le premier affichage soit immédiat.
+    for period_value in ('month', 'quarter', 'year'):
+        options = period_index(key, orders, period_value)
+        if options:
+            tab1_aggregates(key, orders, period_value, options[-1]['value'], [])
+
+def watch_folder(directory, interval):
+    # Chaque fichier est lu séparément et gardé en mémoire avec sa signature (date, taille) :
+    # seuls les fichiers nouveaux ou modifiés sont relus, et un fichier illisible est ignoré
+    # (sans nouvel essai tant qu'il ne change pas) sans empêcher la publication des autres.
+    frames, failed, previous, published = {}, {}, {}, None
+    while True:
+        try:
+            files = scan_watch_dir(directory)
+            # Un fichier n'est lu que si sa date et sa taille n'ont pas bougé depuis le passage précédent :
+            # une copie en cours n'est pas lue à moitié.
+            ready = [path for path, signature in files.items()
+                     if previous.get(path) == signature
+                     and signature not in (frames.get(path, (None,))[0], failed.get(path, (None,))[0])]
+            for path, frame in zip(ready, read_workbooks(ready)):
+                problem = watch_file_problem(path, frame)
+                if problem:
+                    # La dernière version valide du fichier reste publiée.
+                    print(f"Fichier ignoré dans le dossier surveillé : {path} ({problem})", flush=True)
+                    failed[path] = (files[path], problem)
+                else:
+                    frames[path] = (files[path], frame)
+                    failed.pop(path, None)
+            for path in set(frames) - set(files):
+                del frames[path]
+            for path in set(failed) - set(files):
+                del failed[path]
+            previous = files
+
+            state = ({path: signature for path, (signature, _) in frames.items()},
+                     {path: signature for path, (signature, _) in failed.items()}, datetime.today().date())
+            if state != published:
+                published = state
+                with _published_lock:
+                    _published['skipped'] = {path: problem for path, (_, problem) in failed.items()}
+                if frames:
+                    publish_watch_frames(frames)
+                    print(f"Dossier surveillé publié : {len(frames)} fichier(s) depuis {directory}", flush=True)
+        except Exception as e:
+            print(f"Erreur lors du chargement du dossier surveillé {directory} : {e}", flush=True)
+        time.sleep(interval)
+
+def start_watch_folder(directory=WATCH_DIR, interval=WATCH_INTERVAL):
+    if directory:
+        threading.Thread(target=watch_folder, args=(directory, interval), daemon=True).start()
 
 app.layout = html.Div(style={'fontFamily': 'Roboto', 'backgroundColor': COLORS['background'], 'minHeight': '100vh'}, children=[
     dcc.Store(id='stored-data', storage_type='memory'),
     dcc.Store(id='stored-agenda-data', storage_type='memory'),
+    dcc.Store(id='cross-filter', storage_type='memory', data={}),
+    dcc.Interval(id='published-poll', interval=WATCH_INTERVAL * 1000, disabled=not WATCH_DIR),
     
     html.Div(style={'backgroundColor': COLORS['primary'], 'padding': '20px', 'color': 'white'}, children=[
         html.H1("Tableau de Bord de Service", style={'textAlign': 'center', 'fontWeight': '500'}),
@@ -91,6 +434,13 @@ app.layout = html.Div(style={'fontFamily': 'Roboto', 'backgroundColor': COLORS['
             dcc.Dropdown(
                 id='date-dropdown',
                 style={'width': '200px'}
+            ),
+            html.Label("Agence :", style={'marginRight': '10px', 'marginLeft': '20px', 'fontWeight': 'bold'}),
+            dcc.Dropdown(
+                id='branch-dropdown',
+                multi=True,
+                placeholder="Toutes",
+                style={'minWidth': '250px'}
             )
         ])
     ]),
@@ -101,7 +451,7 @@ app.layout = html.Div(style={'fontFamily': 'Roboto', 'backgroundColor': COLORS['
                 children=html.Div([
                     html.I(className="fas fa-file-excel", style={'fontSize': '42px', 'color': COLORS['primary']}),
                     html.Div("Glissez ou"),
-                    html.Button("Sélectionnez un fichier Excel",
+                    html.Button("Sélectionnez un ou plusieurs fichiers Excel",
                                style={
                                    'backgroundColor': COLORS['primary'],
                                    'color': 'white',
@@ -123,7 +473,7 @@ app.layout = html.Div(style={'fontFamily': 'Roboto', 'backgroundColor': COLORS['
                     'border': f'2px dashed {COLORS["primary"]}',
                     'padding': '70px 0'
                 },
-                multiple=False
+                multiple=True
             ),
             html.Div(id='upload-status', style={'marginTop': '10px', 'textAlign': 'center'})
         ]),
@@ -201,17 +551,88 @@ app.layout = html.Div(style={'fontFamily': 'Roboto', 'backgroundColor': COLORS['
     ])
 ])
 
+@app.callback(
+    Output('stored-data', 'data'),
+    [Input('upload-data', 'contents')],
+    [State('upload-data', 'filename')]
+)
+def store_orders(contents, filenames):
+    # Les fichiers ne sont lus et hachés qu'ici : les autres callbacks ne reçoivent que la clé.
+    if not contents:
+        return published_store()
+    try:
+        key, _ = load_orders(contents, filenames)
+    except Exception as e:
+        return {'error': str(e)}
+    try:
+        spool_upload(key, contents, filenames)
+    except OSError as e:
+        print(f"Copie des fichiers déposés impossible dans {UPLOAD_DIR} : {e}", flush=True)
+    return {'key': key, 'source': 'upload'}
+
+@app.callback(
+    Output('stored-data', 'data', allow_duplicate=True),
+    [Input('published-poll', 'n_intervals')],
+    [State('stored-data', 'data')],
+    prevent_initial_call=True
+)
+def refresh_published(n_intervals, store):
+    # Un jeu publié (ou remplacé) par le dossier surveillé après l'ouverture de la page est repris
+    # au passage suivant : la nouvelle clé déclenche un rendu complet de l'onglet.
+    if store and store.get('source') != 'watch':
+        raise PreventUpdate
+    current = published_store()
+    if current is None or current == store:
+        raise PreventUpdate
+    return current
+
 @app.callback(
     Output('upload-status', 'children'),
-    [Input('upload-data', 'contents')]
+    [Input('stored-data', 'data')],
+    [State('upload-data', 'filename')]
 )
-def update_upload_status(contents):
-    if contents:
+def update_upload_status(store, filenames):
+    source = store.get('source') if store else None
+    if source == 'upload' and len(as_list(filenames)) > 1:
+        return html.Div([
+            html.I(className="fas fa-check-circle", style={'color': COLORS['success'], 'marginRight': '10px'}),
+            f"{len(as_list(filenames))} fichiers chargés avec succès"
+        ], style={'color': COLORS['success']})
+    if source == 'upload':
         return html.Div([
             html.I(className="fas fa-check-circle", style={'color': COLORS['success'], 'marginRight': '10px'}),
             "Fichier chargé avec succès"
         ], style={'color': COLORS['success']})
-    return ""
+    if source != 'watch':
+        return ""
+    with _published_lock:
+        updated_at = _published['updated_at']
+        skipped = sorted(_published['skipped'].items())
+    children = []
+    if updated_at is not None:
+        children.append(html.Div([
+            html.I(className="fas fa-folder-open", style={'color': COLORS['primary'], 'marginRight': '10px'}),
+            f"Données du dossier surveillé (mises à jour le {updated_at.strftime('%d/%m/%Y à %H:%M')})"
+        ], style={'color': COLORS['primary']}))
+    for path, problem in skipped:
+        children.append(html.Div([
+            html.I(className="fas fa-exclamation-triangle", style={'color': COLORS['danger'], 'marginRight': '10px'}),
+            f"Fichier ignoré : {os.path.basename(path)} ({problem})"
+        ], style={'color': COLORS['danger']}))
+    return children
+
+@app.callback(
+    [Output('branch-dropdown', 'options'),
+     Output('branch-dropdown', 'value')],
+    [Input('stored-data', 'data')]
+)
+def update_branch_options(store):
+    try:
+        _, orders = resolve_orders(store)
+    except Exception:
+        orders = None
+    branches = sorted(orders['Source'].unique()) if orders is not None else []
+    return [{'label': branch, 'value': branch} for branch in branches], []
 
 @app.callback(
     Output('upload-agenda-status', 'children'),
@@ -225,19 +646,375 @@ def update_agenda_upload_status(contents):
         ], style={'color': COLORS['success']})
     return ""
 
+REQUIRED_COLUMNS = ['Order No.', 'Customer Name', 'Service Technician', 'Model', 'Order Status',
+                    'Created At', 'Approved Date', 'Task Completed Date', 'Order Completed Date',
+                    'Waiting for PO At', 'In Work At', 'Wf. Part At(H)', 'Suspension At']
+
+CHART_COLUMNS = {
+    'order_type': 'Order Type',
+    'order_status': 'Order Status',
+    'product_line': 'Product Line',
+    'warranty_status': 'Warranty Status',
+    'free_chargeable': 'Free/Chargeable',
+}
+
+FOLLOWUP_COLUMNS = ['Source', 'Order No.', 'Customer Name', 'Service Technician', 'Model', 'Order Status',
+                    'Created At', 'Approved Date', 'Task Completed Date', 'Waiting for PO At',
+                    'In Work At', 'Wf. Part At(H)', 'Suspension At', 'Color']
+
+PERIOD_FORMATS = {'month': ('M', '%m-%Y'), 'quarter': ('Q', 'Q%q-%Y'), 'year': ('Y', '%Y')}
+
+def orders_dataset(store):
+    # Renvoie (clé, commandes, erreur) : erreur est un composant à afficher à la place des onglets
+    # (classe 'dashboard-error', repérée par loadtest.py).
+    try:
+        key, orders = resolve_orders(store)
+    except Exception as e:
+        return None, None, html.Div([
+            html.I(className="fas fa-exclamation-triangle", style={'fontSize': '48px', 'color': COLORS['danger']}),
+            html.H4(f"Erreur lors du traitement du fichier: {e}", style={'color': COLORS['danger']})
+        ], className='dashboard-error', style={'textAlign': 'center', 'marginTop': '30px'})
+    if orders is None:
+        return None, None, None
+    if orders.empty:
+        return None, None, html.Div([
+            html.I(className="fas fa-file-excel", style={'fontSize': '48px', 'color': COLORS['warning']}),
+            html.H4("Le fichier Excel est vide.", style={'color': COLORS['warning']})
+        ], className='dashboard-error', style={'textAlign': 'center', 'marginTop': '30px'})
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in orders.columns]
+    if missing_columns:
+        return None, None, html.Div([
+            html.I(className="fas fa-table", style={'fontSize': '48px', 'color': COLORS['warning']}),
+            html.H4("Données incomplètes", style={'color': COLORS['warning']}),
+            html.P(f"Colonnes manquantes : {', '.join(missing_columns)}", style={'color': COLORS['text']})
+        ], className='dashboard-error', style={'textAlign': 'center', 'marginTop': '30px', 'padding': '20px', 'backgroundColor': '#fff8e1', 'borderRadius': '10px'})
+    return key, orders, None
+
+def category_index(key, orders):
+    # Construit une fois par jeu de données : un bitmap de lignes par catégorie (graphiques, agence, période)
+    # et les masques KPI. Un filtre devient un ET de bitmaps suivi d'une agrégation masquée.
+    with _cache_lock:
+        if key in _index_cache:
+            return _index_cache[key]
+    dimensions = {}
+    columns = {column: orders[column] for column in list(CHART_COLUMNS.values()) + ['Source'] if column in orders.columns}
+    columns.update({period_value: orders['Created At'].dt.to_period(freq) for period_value, (freq, _) in PERIOD_FORMATS.items()})
+    for name, values in columns.items():
+        codes, categories = pd.factorize(values)
+        categories = np.array(categories.tolist(), dtype=object)
+        # Les périodes sont indexées par la valeur du menu Date (ex. "03-2024", "Q1-2024", "2024").
+        label_format = PERIOD_FORMATS[name][1] if name in PERIOD_FORMATS else None
+        dimensions[name] = {
+            'codes': codes,
+            'categories': categories,
+            'lookup': {category.strftime(label_format) if label_format else str(category): i
+                       for i, category in enumerate(categories)},
+            'bitmaps': codes[np.newaxis, :] == np.arange(len(categories))[:, np.newaxis],
+        }
+
+    status = orders['Order Status']
+    followup = (orders['Order Completed Date'].isna() & (orders['Color'] != '') & (status != "Cancelled")).to_numpy()
+    if 'Total net value' in orders.columns:
+        net_values = pd.to_numeric(orders['Total net value'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    else:
+        net_values = np.zeros(len(orders))
+    index = {
+        'rows': len(orders),
+        'dimensions': dimensions,
+        'pending': (~status.isin(["Order Complete", "Order Approved", "Task Complete"])).to_numpy(),
+        'followup': followup,
+        'urgent': followup & (orders['Color'] == 'red').to_numpy(),
+        'warning': followup & (orders['Color'] == 'orange').to_numpy(),
+        'net_values': net_values,
+        'has_values': 'Total net value' in orders.columns,
+    }
+    cache_put(_index_cache, key, index, ORDERS_CACHE_SIZE)
+    return index
+
+def dimension_mask(index, name, values):
+    dimension = index['dimensions'].get(name)
+    rows = [dimension['lookup'][str(value)] for value in values if str(value) in dimension['lookup']] if dimension else []
+    if not rows:
+        return np.zeros(index['rows'], dtype=bool)
+    return np.logical_or.reduce(dimension['bitmaps'][rows], axis=0)
+
+def selection_masks(index, period_value, selected_date, selected_branches, cross_filter):
+    # Masque des filtres globaux (agence, période) et un masque par colonne de la sélection croisée.
+    base = np.ones(index['rows'], dtype=bool)
+    if selected_branches:
+        base &= dimension_mask(index, 'Source', selected_branches)
+    if period_value and selected_date:
+        base &= dimension_mask(index, period_value, [selected_date])
+    column_masks = {column: dimension_mask(index, column, values)
+                    for column, values in (cross_filter or {}).items() if values}
+    return base, column_masks
+
+def combine_masks(base, column_masks, exclude=None):
+    mask = base.copy()
+    for column, column_mask in column_masks.items():
+        if column != exclude:
+            mask &= column_mask
+    return mask
+
+def selection_mask(index, period_value, selected_date, selected_branches, cross_filter):
+    return combine_masks(*selection_masks(index, period_value, selected_date, selected_branches, cross_filter))
+
+def masked_counts(index, name, mask, weights=None):
+    dimension = index['dimensions'][name]
+    codes = dimension['codes'][mask]
+    valid = codes >= 0
+    return np.bincount(codes[valid], weights=None if weights is None else weights[mask][valid],
+                       minlength=len(dimension['categories']))
+
+def followup_orders(orders, index, mask):
+    df_filtered = orders.loc[mask & index['followup'], FOLLOWUP_COLUMNS].copy()
+    for col in DATE_COLUMNS:
+        if col in df_filtered.columns:
+            df_filtered[col] = df_filtered[col].dt.strftime('%d %B %Y')
+    return df_filtered
+
+def period_index(key, orders, period_value):
+    cache_key = (key, period_value)
+    with _cache_lock:
+        if cache_key in _period_index_cache:
+            return _period_index_cache[cache_key]
+    created = orders['Created At'].dropna()
+    if period_value == 'month':
+        date_groups = created.dt.strftime('%m-%Y').unique()
+        options = [{'label': datetime.strptime(date, '%m-%Y').strftime('%B %Y'), 'value': date} for date in date_groups]
+    elif period_value == 'quarter':
+        quarters = 'Q' + created.dt.quarter.astype(str) + '-' + created.dt.year.astype(str)
+        options = [{'label': quarter, 'value': quarter} for quarter in quarters.unique()]
+    else:
+        date_groups = created.dt.year.astype(str).unique()
+        options = [{'label': year, 'value': year} for year in date_groups]
+    options = sorted(options, key=lambda x: x['value'])
+    cache_put(_period_index_cache, cache_key, options, AGGREGATES_CACHE_SIZE)
+    return options
+
+def default_date(key, orders, period_value):
+    if not period_value or 'Created At' not in orders.columns:
+        return None
+    options = period_index(key, orders, period_value)
+    return options[-1]['value'] if options else None
+
+def tab1_aggregates(key, orders, period_value, selected_date, selected_branches, cross_filter=None):
+    cache_key = (key, period_value, selected_date, tuple(sorted(selected_branches or [])),
+                 json.dumps(cross_filter or {}, sort_keys=True, default=str))
+    with _cache_lock:
+        if cache_key in _aggregates_cache:
+            return _aggregates_cache[cache_key]
+    index = category_index(key, orders)
+    base, column_masks = selection_masks(index, period_value, selected_date, selected_branches, cross_filter)
+    data = tab1_data(index, base, column_masks, cross_filter)
+    cache_put(_aggregates_cache, cache_key, data, AGGREGATES_CACHE_SIZE)
+    return data
+
+def tab1_data(index, base, column_masks, cross_filter):
+    mask = combine_masks(base, column_masks)
+    status_counts = masked_counts(index, 'Order Status', mask)
+    status_values = masked_counts(index, 'Order Status', mask, index['net_values'])
+    statuses = index['dimensions']['Order Status']['categories']
+    present = sorted(np.flatnonzero(status_counts), key=lambda i: str(statuses[i]))
+    status_data = pd.DataFrame({
+        'Statut': statuses[present],
+        'Nombre': status_counts[present],
+    })
+    if index['has_values']:
+        status_data['Valeur (€)'] = status_values[present].round(2)
+
+    charts = {}
+    for key, column in CHART_COLUMNS.items():
+        if column not in index['dimensions']:
+            charts[key] = None
+            continue
+        # Chaque graphique ignore sa propre sélection : on voit toutes ses catégories et on peut en cumuler plusieurs.
+        counts = masked_counts(index, column, combine_masks(base, column_masks, exclude=column))
+        order = [i for i in np.argsort(-counts, kind='stable') if counts[i] > 0]
+        counts = pd.DataFrame({'Catégorie': index['dimensions'][column]['categories'][order], 'Nombre': counts[order]})
+        if key in ('order_type', 'order_status'):
+            counts = regrouper_autres(counts, 'Catégorie', 'Nombre')
+        selected = {str(value) for value in (cross_filter or {}).get(column, [])}
+        labels = counts['Catégorie'].tolist()
+        charts[key] = (labels, counts['Nombre'].tolist(), [str(label) in selected for label in labels])
+
+    return {
+        'total_orders': int(mask.sum()),
+        'pending_orders': int((mask & index['pending']).sum()),
+        'warning_orders': int((mask & index['warning']).sum()),
+        'urgent_orders': int((mask & index['urgent']).sum()),
+        'status_data': status_data,
+        'total_sum_text': f"{index['net_values'][mask].sum():.2f} €" if index['has_values'] else "",
+        'charts': charts,
+    }
+
+def cross_filter_text(cross_filter):
+    parts = [f"{column} : {', '.join(str(value) for value in values)}" for column, values in (cross_filter or {}).items() if values]
+    if not parts:
+        return "Cliquez sur un graphique pour filtrer l'ensemble du tableau de bord"
+    return "Filtres actifs — " + " · ".join(parts)
+
+def slice_pull(highlight):
+    return [0.12 if selected else 0 for selected in highlight]
+
+def bar_opacity(highlight):
+    return [1 if selected or not any(highlight) else 0.35 for selected in highlight]
+
+def chart_figure(key, labels, values, highlight):
+    px = get_px()
+    if key == 'order_type':
+        fig = px.pie(pd.DataFrame({"Type de Commande": labels, "Nombre": values}), values="Nombre", names="Type de Commande",
+                     title="Types de commandes", hole=0.4, color_discrete_sequence=px.colors.sequential.Blues_r)
+        fig.update_layout(legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
+                          margin=dict(t=40, b=40, l=20, r=20))
+    elif key == 'order_status':
+        fig = px.pie(pd.DataFrame({"Statut": labels, "Nombre": values}), values="Nombre", names="Statut",
+                     title="Statuts des commandes", hole=0.4, color_discrete_sequence=px.colors.sequential.Greens_r)
+        fig.update_layout(legend=dict(orientation="h", y=-5, xanchor="center", x=0.5),
+                          margin=dict(t=40, b=40, l=20, r=20))
+    elif key == 'product_line':
+        fig = px.bar(x=values, y=labels, orientation='h', title="Répartition des produits")
+        fig.update_layout(xaxis_title="Nombre de commandes", yaxis_title="",
+                          margin=dict(t=40, b=20, l=20, r=20))
+    elif key == 'warranty_status':
+        fig = px.pie(values=values, names=labels, title="Statut de garantie", hole=0.4,
+                     color_discrete_sequence=px.colors.sequential.Oranges_r)
+        fig.update_layout(legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
+                          margin=dict(t=40, b=40, l=20, r=20))
+    else:
+        fig = px.pie(names=labels, values=values, title="Répartition Free/Chargeable", hole=0.4)
+        fig.update_layout(legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
+                          margin=dict(t=50, b=50, l=20, r=20))
+    # Les catégories sélectionnées ressortent (part détachée, barres pleines) sans masquer les autres.
+    if key == 'product_line':
+        fig.update_traces(marker_opacity=bar_opacity(highlight))
+    else:
+        fig.update_traces(pull=slice_pull(highlight))
+    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+    return fig
+
+def chart_patch(key, labels, values, highlight):
+    # Seules les valeurs des traces changent d'une période à l'autre : layout et styles restent côté client.
+    fig = Patch()
+    if key == 'product_line':
+        fig['data'][0]['x'] = values
+        fig['data'][0]['y'] = labels
+        fig['data'][0]['marker']['opacity'] = bar_opacity(highlight)
+    else:
+        fig['data'][0]['labels'] = labels
+        fig['data'][0]['values'] = values
+        fig['data'][0]['pull'] = slice_pull(highlight)
+    return fig
+
+def chart_graph(key, data, extra=None):
+    chart = data['charts'][key]
+    figure = chart_figure(key, *chart) if chart is not None else {}
+    children = [dcc.Graph(id=f'graph-{key}', figure=figure, config={'displayModeBar': False})]
+    if extra is not None:
+        children.append(extra)
+    style = {'flex': '1', 'padding': '10px', 'minWidth': '400px'}
+    if chart is None:
+        style['display'] = 'none'
+    return html.Div(className='col', style=style, children=[html.Div(style=CARD_STYLE, children=children)])
+
+def kpi_card(kpi_id, value, label, color):
+    return html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '200px'}, children=[
+        html.Div(style={**CARD_STYLE, 'backgroundColor': color, 'color': 'white'}, children=[
+            html.H2(value, id=kpi_id, style={'textAlign': 'center', 'margin': '0', 'fontSize': '42px'}),
+            html.P(label, style={'textAlign': 'center', 'margin': '5px 0 0 0', 'opacity': '0.8'})
+        ])
+    ])
+
+def tab1_layout(data, cross_filter):
+    status_data = data['status_data']
+    filter_bar = html.Div(style={**CARD_STYLE, 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'space-between', 'padding': '10px 20px'}, children=[
+        html.Span(cross_filter_text(cross_filter), id='cross-filter-summary', style={'color': COLORS['text'], 'fontStyle': 'italic'}),
+        html.Button("Réinitialiser les filtres", id='cross-filter-reset', n_clicks=0,
+                    style={
+                        'backgroundColor': COLORS['primary'],
+                        'color': 'white',
+                        'border': 'none',
+                        'padding': '8px 12px',
+                        'borderRadius': '5px',
+                        'cursor': 'pointer'
+                    })
+    ])
+    kpi_cards = html.Div([
+        html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '0 -10px'}, children=[
+            kpi_card('kpi-total', data['total_orders'], "Total des commandes", COLORS['primary']),
+            kpi_card('kpi-pending', data['pending_orders'], "Commandes en cours", COLORS['success']),
+            kpi_card('kpi-warning', data['warning_orders'], "Attention requise", COLORS['warning']),
+            kpi_card('kpi-urgent', data['urgent_orders'], "Commandes urgentes", COLORS['danger'])
+        ])
+    ])
+
+    status_detail_card = html.Div(style={**CARD_STYLE, 'marginTop': '20px'}, children=[
+        html.H3("Total des dossiers", style={'marginTop': '0', 'marginBottom': '20px', 'color': COLORS['dark']}),
+        html.Div(style={'overflowX': 'auto'}, children=[
+            dash_table.DataTable(
+                id='status-table',
+                data=status_data.to_dict('records'),
+                columns=[{'name': col, 'id': col, 'type': 'numeric' if col != 'Statut' else 'text'} for col in status_data.columns],
+                style_header={
+                    'backgroundColor': COLORS['light'],
+                    'fontWeight': 'bold',
+                    'border': f'1px solid {COLORS["light"]}',
+                    'textAlign': 'center',
+                },
+                style_cell={
+                    'textAlign': 'center',
+                    'padding': '10px',
+                    'fontFamily': 'Roboto',
+                },
+                style_cell_conditional=[
+                    {'if': {'column_id': 'Statut'}, 'textAlign': 'left', 'fontWeight': 'bold'},
+                    {'if': {'column_id': 'Nombre'}, 'width': '120px'},
+                    {'if': {'column_id': 'Valeur (€)'}, 'width': '150px'}
+                ],
+                style_data_conditional=[{'if': {'row_index': 'odd'}, 'backgroundColor': 'rgba(0, 0, 0, 0.05)'}],
+            )
+        ])
+    ])
+
+    # Toujours présent pour patch_tab1, masqué sans colonne 'Total net value'.
+    total_value_style = {'textAlign': 'center', 'marginTop': '10px'}
+    if not data['total_sum_text']:
+        total_value_style['display'] = 'none'
+    total_value = html.Div(style=total_value_style, children=[
+        html.Strong("Valeur totale: ", style={'marginRight': '5px', 'fontSize': '16px'}),
+        html.Span(data['total_sum_text'], id='status-total-value', style={'fontSize': '16px', 'color': COLORS['primary']})
+    ])
+    graphs = [
+        html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '20px -10px'}, children=[
+            chart_graph('order_type', data),
+            chart_graph('order_status', data, total_value)
+        ]),
+        html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '20px -10px'}, children=[
+            chart_graph('product_line', data),
+            chart_graph('warranty_status', data)
+        ]),
+        html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '20px -10px'}, children=[
+            chart_graph('free_chargeable', data)
+        ])
+    ]
+    return html.Div([filter_bar, kpi_cards, status_detail_card, html.Div(graphs)])
+
 @app.callback(
     Output('tabs-content', 'children'),
     [Input('tabs', 'value'),
-     Input('upload-data', 'contents'),
-     Input('upload-agenda', 'contents'),
-     Input('period-dropdown', 'value'),
-     Input('date-dropdown', 'value')]
+     Input('stored-data', 'data'),
+     Input('upload-agenda', 'contents')],
+    [State('period-dropdown', 'value'),
+     State('date-dropdown', 'value'),
+     State('branch-dropdown', 'value'),
+     State('cross-filter', 'data')]
 )
-def update_tab(tab, orders_contents, agenda_contents, period_value, selected_date):
-    global df, df_agenda
-
+def update_tab(tab, store, agenda_contents, period_value, selected_date, selected_branches, cross_filter):
+    # Les filtres ne passent pas par ici : patch_tab1 et update_followup mettent à jour l'onglet affiché.
     if tab in ['tab1', 'tab2']:
-        if not orders_contents:
+        key, orders, error = orders_dataset(store)
+        if orders is None and error is None:
             return html.Div([
                 html.Div(
                     html.Img(src='/assets/upload_icon.png', style={'width': '100px', 'opacity': '0.3'}),
@@ -246,320 +1023,24 @@ def update_tab(tab, orders_contents, agenda_contents, period_value, selected_dat
                 html.H3("Veuillez télécharger un fichier Excel pour commencer",
                         style={'textAlign': 'center', 'color': COLORS['text'], 'opacity': '0.7', 'fontWeight': '400'})
             ])
-        try:
-            df = parse_contents(orders_contents)
-        except Exception as e:
-            return html.Div([
-                html.I(className="fas fa-exclamation-triangle", style={'fontSize': '48px', 'color': COLORS['danger']}),
-                html.H4(f"Erreur lors du traitement du fichier: {e}", style={'color': COLORS['danger']})
-            ], style={'textAlign': 'center', 'marginTop': '30px'})
-        if df.empty:
-            return html.Div([
-                html.I(className="fas fa-file-excel", style={'fontSize': '48px', 'color': COLORS['warning']}),
-                html.H4("Le fichier Excel est vide.", style={'color': COLORS['warning']})
-            ], style={'textAlign': 'center', 'marginTop': '30px'})
-        
-        required_columns = ['Order No.', 'Customer Name', 'Service Technician', 'Model', 'Order Status',
-                            'Created At', 'Approved Date', 'Task Completed Date', 'Order Completed Date',
-                            'Waiting for PO At', 'In Work At', 'Wf. Part At(H)', 'Suspension At']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return html.Div([
-                html.I(className="fas fa-table", style={'fontSize': '48px', 'color': COLORS['warning']}),
-                html.H4("Données incomplètes", style={'color': COLORS['warning']}),
-                html.P(f"Colonnes manquantes : {', '.join(missing_columns)}", style={'color': COLORS['text']})
-            ], style={'textAlign': 'center', 'marginTop': '30px', 'padding': '20px', 'backgroundColor': '#fff8e1', 'borderRadius': '10px'})
-        
-        if 'Order Completed Date' not in df.columns:
-            df['Order Completed Date'] = pd.NaT
-        
-        date_columns = ['Created At', 'Approved Date', 'Task Completed Date', 'Order Completed Date',
-                        'Waiting for PO At', 'In Work At', 'Wf. Part At(H)', 'Suspension At']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        today = datetime.today()
-
-        if 'Created At' in df.columns and period_value and selected_date:
-            if period_value == 'month':
-                month, year = selected_date.split('-')
-                mask = (df['Created At'].dt.month == int(month)) & (df['Created At'].dt.year == int(year))
-            elif period_value == 'quarter':
-                quarter, year = selected_date.split('-')
-                quarter_num = int(quarter[1])
-                start_month = (quarter_num - 1) * 3 + 1
-                end_month = quarter_num * 3
-                mask = (df['Created At'].dt.year == int(year)) & (df['Created At'].dt.month >= start_month) & (df['Created At'].dt.month <= end_month)
-            else:  # année
-                mask = df['Created At'].dt.year == int(selected_date)
-            df = df[mask]
-
-        if 'Total net value' not in df.columns:
-            df['Total net value'] = 0
-
-        def color_code(row):
-            today_date = datetime.today().date()
-            if pd.notna(row['Order Completed Date']):
-                days = (today_date - row['Order Completed Date'].date()).days
-                if days >= 30:
-                    return 'red'
-                elif days >= 15:
-                    return 'orange'
-                else:
-                    return ''
-            if pd.notna(row['Task Completed Date']):
-                days = (today_date - row['Task Completed Date'].date()).days
-                if days >= 30:
-                    return 'red'
-                elif days >= 15:
-                    return 'orange'
-                else:
-                    return ''
-            if pd.notna(row['In Work At']):
-                days = (today_date - row['In Work At'].date()).days
-                if days >= 14:
-                    return 'red'
-                elif days >= 7:
-                    return 'orange'
-                else:
-                    return ''
-            if pd.notna(row['Suspension At']):
-                days = (today_date - row['Suspension At'].date()).days
-                if days >= 30:
-                    return 'red'
-                elif days >= 15:
-                    return 'orange'
-                else:
-                    return ''
-            if pd.notna(row['Wf. Part At(H)']):
-                days = (today_date - row['Wf. Part At(H)'].date()).days
-                if days >= 14:
-                    return 'red'
-                elif days >= 7:
-                    return 'orange'
-                else:
-                    return ''
-            if pd.notna(row['Waiting for PO At']):
-                days = (today_date - row['Waiting for PO At'].date()).days
-                if days >= 30:
-                    return 'red'
-                elif days >= 15:
-                    return 'orange'
-                else:
-                    return ''
-            if pd.notna(row['Created At']):
-                days = (today_date - row['Created At'].date()).days
-                if days >= 30:
-                    return 'red'
-                elif days >= 15:
-                    return 'orange'
-                else:
-                    return ''
-            return ''
-        
-        df['Color'] = df.apply(color_code, axis=1)
-        df_filtered = df[df['Order Completed Date'].isna() & (df['Color'] != '') & (df['Order Status'] != "Cancelled")]
-        df_filtered = df_filtered[['Order No.', 'Customer Name', 'Service Technician', 'Model', 'Order Status',
-                                   'Created At', 'Approved Date', 'Task Completed Date', 'Waiting for PO At',
-                                   'In Work At', 'Wf. Part At(H)', 'Suspension At', 'Color']]
-        for col in date_columns:
-            if col in df_filtered.columns:
-                df_filtered[col] = df_filtered[col].dt.strftime('%d %B %Y')
-        
-        graph_columns = {
-            'order_type': 'Order Type',
-            'order_status': 'Order Status',
-            'Total net value': 'Total net value',
-            'product_line': 'Product Line',
-            'warranty_status': 'Warranty Status',
-            'free_chargeable': 'Free/Chargeable',
-            'created_date': 'Created At'
-        }
-        existing_columns = {key: col for key, col in graph_columns.items() if col in df.columns}
+        if error is not None:
+            return error
+        if dash.callback_context.triggered_id == 'stored-data':
+            # Nouveau jeu : les listes déroulantes et la sélection sont réinitialisées en parallèle,
+            # on rend directement avec leurs valeurs par défaut.
+            selected_date, selected_branches, cross_filter = default_date(key, orders, period_value), [], {}
 
         if tab == 'tab1':
-            total_orders = len(df)
-            pending_orders = len(df[~df["Order Status"].isin(["Order Complete", "Order Approved", "Task Complete"])])
-            urgent_orders = len(df_filtered[df_filtered['Color'] == 'red'])
-            warning_orders = len(df_filtered[df_filtered['Color'] == 'orange'])
-            
-            if 'Total net value' in existing_columns:
-                status_data = df.groupby('Order Status').agg({
-                    'Order No.': 'count',
-                    existing_columns['Total net value']: 'sum'
-                }).reset_index()
-                status_data.columns = ['Statut', 'Nombre', 'Valeur (€)']
-                status_data['Valeur (€)'] = status_data['Valeur (€)'].round(2)
-            else:
-                status_data = df.groupby('Order Status').agg({'Order No.': 'count'}).reset_index()
-                status_data.columns = ['Statut', 'Nombre']
-            
-            kpi_cards = html.Div([
-                html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '0 -10px'}, children=[
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '200px'}, children=[
-                        html.Div(style={**CARD_STYLE, 'backgroundColor': COLORS['primary'], 'color': 'white'}, children=[
-                            html.H2(total_orders, style={'textAlign': 'center', 'margin': '0', 'fontSize': '42px'}),
-                            html.P("Total des commandes", style={'textAlign': 'center', 'margin': '5px 0 0 0', 'opacity': '0.8'})
-                        ])
-                    ]),
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '200px'}, children=[
-                        html.Div(style={**CARD_STYLE, 'backgroundColor': COLORS['success'], 'color': 'white'}, children=[
-                            html.H2(pending_orders, style={'textAlign': 'center', 'margin': '0', 'fontSize': '42px'}),
-                            html.P("Commandes en cours", style={'textAlign': 'center', 'margin': '5px 0 0 0', 'opacity': '0.8'})
-                        ])
-                    ]),
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '200px'}, children=[
-                        html.Div(style={**CARD_STYLE, 'backgroundColor': COLORS['warning'], 'color': 'white'}, children=[
-                            html.H2(warning_orders, style={'textAlign': 'center', 'margin': '0', 'fontSize': '42px'}),
-                            html.P("Attention requise", style={'textAlign': 'center', 'margin': '5px 0 0 0', 'opacity': '0.8'})
-                        ])
-                    ]),
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '200px'}, children=[
-                        html.Div(style={**CARD_STYLE, 'backgroundColor': COLORS['danger'], 'color': 'white'}, children=[
-                            html.H2(urgent_orders, style={'textAlign': 'center', 'margin': '0', 'fontSize': '42px'}),
-                            html.P("Commandes urgentes", style={'textAlign': 'center', 'margin': '5px 0 0 0', 'opacity': '0.8'})
-                        ])
-                    ])
-                ])
-            ])
-            
-            status_detail_card = html.Div(style={**CARD_STYLE, 'marginTop': '20px'}, children=[
-                html.H3("Total des dossiers", style={'marginTop': '0', 'marginBottom': '20px', 'color': COLORS['dark']}),
-                html.Div(style={'overflowX': 'auto'}, children=[
-                    dash_table.DataTable(
-                        data=status_data.to_dict('records'),
-                        columns=[{'name': col, 'id': col, 'type': 'numeric' if col != 'Statut' else 'text'} for col in status_data.columns],
-                        style_header={
-                            'backgroundColor': COLORS['light'],
-                            'fontWeight': 'bold',
-                            'border': f'1px solid {COLORS["light"]}',
-                            'textAlign': 'center',
-                        },
-                        style_cell={
-                            'textAlign': 'center',
-                            'padding': '10px',
-                            'fontFamily': 'Roboto',
-                        },
-                        style_cell_conditional=[
-                            {'if': {'column_id': 'Statut'}, 'textAlign': 'left', 'fontWeight': 'bold'},
-                            {'if': {'column_id': 'Nombre'}, 'width': '120px'},
-                            {'if': {'column_id': 'Valeur (€)'}, 'width': '150px'}
-                        ],
-                        style_data_conditional=[{'if': {'row_index': 'odd'}, 'backgroundColor': 'rgba(0, 0, 0, 0.05)'}],
-                    )
-                ])
-            ])
-            
-            graphs = []
-            row1 = html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '20px -10px'}, children=[])
-            if "Order Type" in df.columns:
-                df_order_type = df["Order Type"].value_counts().reset_index()
-                df_order_type.columns = ["Type de Commande", "Nombre"]
-                df_order_type = regrouper_autres(df_order_type, "Type de Commande", "Nombre")
-                fig_order_type = px.pie(df_order_type, values="Nombre", names="Type de Commande",
-                                       title="Types de commandes", hole=0.4, color_discrete_sequence=px.colors.sequential.Blues_r)
-                fig_order_type.update_layout(
-                    legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
-                    margin=dict(t=40, b=40, l=20, r=20),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                row1.children.append(
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '400px'},
-                             children=[html.Div(style=CARD_STYLE, children=[dcc.Graph(figure=fig_order_type, config={'displayModeBar': False})])])
-                )
-            if "Order Status" in df.columns:
-                df_status = df["Order Status"].value_counts().reset_index()
-                df_status.columns = ["Statut", "Nombre"]
-                df_status = regrouper_autres(df_status, "Statut", "Nombre")
-                status_fig = px.pie(df_status, values="Nombre", names="Statut",
-                                    title="Statuts des commandes", hole=0.4, color_discrete_sequence=px.colors.sequential.Greens_r)
-                status_fig.update_layout(
-                    legend=dict(orientation="h", y=-5, xanchor="center", x=0.5),
-                    margin=dict(t=40, b=40, l=20, r=20),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                total_sum_text = ""
-                if 'Total net value' in existing_columns:
-                    total_sum = df[existing_columns['Total net value']].sum()
-                    total_sum_text = f"{total_sum:.2f} €"
-                row1.children.append(
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '400px'},
-                             children=[html.Div(style=CARD_STYLE, children=[
-                                 dcc.Graph(figure=status_fig, config={'displayModeBar': False}),
-                                 html.Div(style={'textAlign': 'center', 'marginTop': '10px'}, children=[
-                                     html.Strong("Valeur totale: ", style={'marginRight': '5px', 'fontSize': '16px'}),
-                                     html.Span(total_sum_text, style={'fontSize': '16px', 'color': COLORS['primary']})
-                                 ]) if total_sum_text else None
-                             ])])
-                )
-            graphs.append(row1)
-            row2 = html.Div(className='row', style={'display': 'flex', 'flexWrap': 'wrap', 'margin': '20px -10px'}, children=[])
-            if 'product_line' in existing_columns:
-                product_values = df[existing_columns['product_line']].value_counts().to_dict()
-                product_fig = px.bar(
-                    x=list(product_values.values()),
-                    y=list(product_values.keys()),
-                    orientation='h',
-                    title="Répartition des produits"
-                )
-                product_fig.update_layout(
-                    xaxis_title="Nombre de commandes",
-                    yaxis_title="",
-                    margin=dict(t=40, b=20, l=20, r=20),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                row2.children.append(
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '400px'},
-                             children=[html.Div(style=CARD_STYLE, children=[dcc.Graph(figure=product_fig, config={'displayModeBar': False})])])
-                )
-            if 'warranty_status' in existing_columns:
-                warranty_values = df[existing_columns['warranty_status']].value_counts()
-                warranty_fig = px.pie(
-                    values=warranty_values.values,
-                    names=warranty_values.index,
-                    title="Statut de garantie",
-                    hole=0.4,
-                    color_discrete_sequence=px.colors.sequential.Oranges_r
-                )
-                warranty_fig.update_layout(
-                    legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
-                    margin=dict(t=40, b=40, l=20, r=20),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                row2.children.append(
-                    html.Div(className='col', style={'flex': '1', 'padding': '10px', 'minWidth': '400px'},
-                             children=[html.Div(style=CARD_STYLE, children=[dcc.Graph(figure=warranty_fig, config={'displayModeBar': False})])])
-                )
-            graphs.append(row2)
-            if 'Free/Chargeable' in df.columns:
-                free_counts = df['Free/Chargeable'].value_counts()
-                fig_free = px.pie(
-                    names=free_counts.index,
-                    values=free_counts.values,
-                    title="Répartition Free/Chargeable",
-                    hole=0.4
-                )
-                fig_free.update_layout(
-                    legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
-                    margin=dict(t=50, b=50, l=20, r=20),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                free_section = html.Div(style=CARD_STYLE, children=[dcc.Graph(figure=fig_free, config={'displayModeBar': False})])
-                graphs.append(free_section)
-            
-            return html.Div([kpi_cards, status_detail_card, html.Div(graphs)])
-        
+            return tab1_layout(tab1_aggregates(key, orders, period_value, selected_date, selected_branches, cross_filter), cross_filter)
         elif tab == 'tab2':
+            index = category_index(key, orders)
+            df_filtered = followup_orders(orders, index, selection_mask(index, period_value, selected_date, selected_branches, cross_filter))
             return html.Div(style={**CARD_STYLE, 'overflowX': 'auto'}, children=[
                 html.H3("Commandes à suivre", style={'marginTop': '0', 'marginBottom': '20px', 'color': COLORS['dark']}),
-                html.P(f"{len(df_filtered)} commandes nécessitent votre attention",
+                html.P(f"{len(df_filtered)} commandes nécessitent votre attention", id='followup-count',
                        style={'marginBottom': '20px', 'fontStyle': 'italic', 'color': COLORS['text']}),
                 dash_table.DataTable(
+                    id='followup-table',
                     data=df_filtered.to_dict('records'),
                     columns=[{'name': col, 'id': col} for col in df_filtered.columns if col != 'Color'],
                     style_header={
@@ -593,7 +1074,7 @@ def update_tab(tab, orders_contents, agenda_contents, period_value, selected_dat
                 )
             ])
     elif tab == 'tab3':
-        if not agenda_contents:
+        if not agenda_contents and published_agenda() is None:
             return html.Div([
                 html.Div(
                     html.Img(src='/assets/upload_icon.png', style={'width': '100px', 'opacity': '0.3'}),
@@ -603,12 +1084,12 @@ def update_tab(tab, orders_contents, agenda_contents, period_value, selected_dat
                         style={'textAlign': 'center', 'color': COLORS['text'], 'opacity': '0.7', 'fontWeight': '400'})
             ])
         try:
-            df_agenda = parse_contents(agenda_contents)
+            df_agenda = parse_contents(agenda_contents) if agenda_contents else published_agenda()
         except Exception as e:
             return html.Div([
                 html.I(className="fas fa-exclamation-triangle", style={'fontSize': '48px', 'color': COLORS['danger']}),
                 html.H4(f"Erreur lors du traitement du fichier Agenda: {e}", style={'color': COLORS['danger']})
-            ], style={'textAlign': 'center', 'marginTop': '30px'})
+            ], className='dashboard-error', style={'textAlign': 'center', 'marginTop': '30px'})
         
         if "Nom" in df_agenda.columns:
             total_labels = ["Total Jour présence workshoop", "Mail traitées", "Appel recue", "Total carton", "SORTIE EQUIPEMENT", "Garde"]
@@ -698,94 +1179,125 @@ def update_tab(tab, orders_contents, agenda_contents, period_value, selected_dat
     else:
         return html.Div("Onglet non implémenté.")
 
+@app.callback(
+    [Output('kpi-total', 'children'),
+     Output('kpi-pending', 'children'),
+     Output('kpi-warning', 'children'),
+     Output('kpi-urgent', 'children'),
+     Output('status-table', 'data'),
+     Output('status-total-value', 'children'),
+     Output('cross-filter-summary', 'children')] +
+    [Output(f'graph-{key}', 'figure') for key in CHART_COLUMNS],
+    [Input('period-dropdown', 'value'),
+     Input('date-dropdown', 'value'),
+     Input('branch-dropdown', 'value'),
+     Input('cross-filter', 'data')],
+    [State('stored-data', 'data')],
+    prevent_initial_call=True
+)
+def patch_tab1(period_value, selected_date, selected_branches, cross_filter, store):
+    key, orders, error = orders_dataset(store)
+    if orders is None or error is not None:
+        raise PreventUpdate
+    data = tab1_aggregates(key, orders, period_value, selected_date, selected_branches, cross_filter)
+    figures = [chart_patch(chart_key, *data['charts'][chart_key]) if data['charts'][chart_key] is not None else dash.no_update
+               for chart_key in CHART_COLUMNS]
+    return [data['total_orders'], data['pending_orders'], data['warning_orders'], data['urgent_orders'],
+            data['status_data'].to_dict('records'), data['total_sum_text'], cross_filter_text(cross_filter)] + figures
+
+@app.callback(
+    [Output('followup-count', 'children'),
+     Output('followup-table', 'data')],
+    [Input('period-dropdown', 'value'),
+     Input('date-dropdown', 'value'),
+     Input('branch-dropdown', 'value'),
+     Input('cross-filter', 'data')],
+    [State('stored-data', 'data')],
+    prevent_initial_call=True
+)
+def update_followup(period_value, selected_date, selected_branches, cross_filter, store):
+    key, orders, error = orders_dataset(store)
+    if orders is None or error is not None:
+        raise PreventUpdate
+    index = category_index(key, orders)
+    df_filtered = followup_orders(orders, index, selection_mask(index, period_value, selected_date, selected_branches, cross_filter))
+    return f"{len(df_filtered)} commandes nécessitent votre attention", df_filtered.to_dict('records')
+
+@app.callback(
+    Output('cross-filter', 'data'),
+    [Input(f'graph-{key}', 'clickData') for key in CHART_COLUMNS] +
+    [Input('cross-filter-reset', 'n_clicks')],
+    [State('cross-filter', 'data')],
+    prevent_initial_call=True
+)
+def update_cross_filter(*args):
+    # Un clic ajoute ou retire la catégorie de la sélection : OU dans une même colonne, ET entre colonnes.
+    cross_filter = dict(args[-1] or {})
+    trigger = dash.callback_context.triggered_id
+    if trigger == 'cross-filter-reset':
+        return {}
+    chart_key = trigger[len('graph-'):]
+    click_data = args[list(CHART_COLUMNS).index(chart_key)]
+    if not click_data or not click_data.get('points'):
+        raise PreventUpdate
+    point = click_data['points'][0]
+    value = point.get('label', point.get('y'))
+    if value is None or value == "Autres":
+        raise PreventUpdate
+    column = CHART_COLUMNS[chart_key]
+    values = list(cross_filter.get(column, []))
+    if value in values:
+        values.remove(value)
+    else:
+        values.append(value)
+    if values:
+        cross_filter[column] = values
+    else:
+        cross_filter.pop(column, None)
+    return cross_filter
+
+@app.callback(
+    Output('cross-filter', 'data', allow_duplicate=True),
+    [Input('stored-data', 'data')],
+    prevent_initial_call=True
+)
+def reset_cross_filter(store):
+    return {}
+
 @app.callback(
     [Output('date-dropdown', 'options'),
      Output('date-dropdown', 'value')],
     [Input('period-dropdown', 'value'),
-     Input('upload-data', 'contents')]
+     Input('stored-data', 'data')]
 )
-def update_date_options(period_value, contents):
-    if not contents or not period_value:
+def update_date_options(period_value, store):
+    if not period_value:
         return [], None
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df_temp = pd.read_excel(io.BytesIO(decoded))
-    if 'Created At' not in df_temp.columns:
+    try:
+        key, orders = resolve_orders(store)
+    except Exception:
         return [], None
-    df_temp['Created At'] = pd.to_datetime(df_temp['Created At'], errors='coerce')
-    if period_value == 'month':
-        date_groups = df_temp['Created At'].dt.strftime('%m-%Y').unique()
-        options = [{'label': datetime.strptime(date, '%m-%Y').strftime('%B %Y'), 'value': date} for date in date_groups if pd.notna(date)]
-    elif period_value == 'quarter':
-        df_temp['Quarter'] = 'Q' + df_temp['Created At'].dt.quarter.astype(str) + '-' + df_temp['Created At'].dt.year.astype(str)
-        options = [{'label': quarter, 'value': quarter} for quarter in df_temp['Quarter'].unique() if pd.notna(quarter)]
-    else:
-        date_groups = df_temp['Created At'].dt.year.astype(str).unique()
-        options = [{'label': year, 'value': year} for year in date_groups if pd.notna(year)]
-    options = sorted(options, key=lambda x: x['value'])
-    default_value = options[-1]['value'] if options else None
-    return options, default_value
+    if orders is None or 'Created At' not in orders.columns:
+        return [], None
+    return period_index(key, orders, period_value), default_date(key, orders, period_value)
 
-@app.callback(
-    Output('free-chargeable-graph-container', 'children'),
-    [Input('date-dropdown', 'value'),
-     Input('period-dropdown', 'value'),
-     Input('upload-data', 'contents')]
-)
-def update_free_chargeable_graph(selected_date, period_value, contents):
-    if not contents or not selected_date or not period_value:
-        return html.Div("Sélectionnez une période et une date pour voir les données")
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df_temp = pd.read_excel(io.BytesIO(decoded))
-    if 'Created At' not in df_temp.columns or 'Free/Chargeable' not in df_temp.columns:
-        return html.Div("Les colonnes 'Created At' ou 'Free/Chargeable' sont manquantes dans le fichier")
-    df_temp['Created At'] = pd.to_datetime(df_temp['Created At'], errors='coerce')
-    if period_value == 'month':
-        month, year = selected_date.split('-')
-        mask = (df_temp['Created At'].dt.month == int(month)) & (df_temp['Created At'].dt.year == int(year))
-        title = f"Répartition Free/Chargeable - {datetime.strptime(selected_date, '%m-%Y').strftime('%B %Y')}"
-    elif period_value == 'quarter':
-        quarter, year = selected_date.split('-')
-        quarter_num = int(quarter[1])
-        start_month = (quarter_num - 1) * 3 + 1
-        end_month = quarter_num * 3
-        mask = (df_temp['Created At'].dt.year == int(year)) & (df_temp['Created At'].dt.month >= start_month) & (df_temp['Created At'].dt.month <= end_month)
-        title = f"Répartition Free/Chargeable - {selected_date}"
-    else:
-        mask = df_temp['Created At'].dt.year == int(selected_date)
-        title = f"Répartition Free/Chargeable - Année {selected_date}"
-    filtered_df = df_temp[mask]
-    if filtered_df.empty:
-        return html.Div("Aucune donnée disponible pour cette période",
-                        style={'textAlign': 'center', 'padding': '20px', 'color': COLORS['text']})
-    free_chargeable_counts = filtered_df['Free/Chargeable'].value_counts()
-    fig = px.pie(
-        names=free_chargeable_counts.index,
-        values=free_chargeable_counts.values,
-        title=title,
-        color_discrete_sequence=px.colors.sequential.RdBu_r
-    )
-    fig.update_layout(
-        legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
-        margin=dict(t=50, b=50, l=20, r=20),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)'
-    )
-    stats_div = html.Div()
-    if 'Total net value' in df_temp.columns:
-        total_value = filtered_df.groupby('Free/Chargeable')['Total net value'].sum().to_dict()
-        stats_rows = []
-        for category, count in free_chargeable_counts.items():
-            value = total_value.get(category, 0)
-            percentage = (count / free_chargeable_counts.sum()) * 100
-            stats_rows.append(html.Tr([
-                html.Td(category, style={'fontWeight': 'bold', 'padding': '8px'}),
-                html.Td(f"{count} ({percentage:.1f}%)", style={'padding': '8px', 'textAlign': 'center'}),
-                html.Td(f"{value:.2f} €", style={'padding': '8px', 'textAlign': 'right'})
-            ]))
-        stats_div = html.Table(stats_rows, style={'margin': '20px auto', 'borderCollapse': 'collapse'})
-    return html.Div([dcc.Graph(figure=fig, config={'displayModeBar': False}), stats_div])
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_tasks():
+    # Lancé à l'import pour que `waitress-serve final:server` précharge les modules et surveille
+    # le dossier comme `python final.py`, une seule fois par processus.
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    threading.Thread(target=warm_up_modules, daemon=True).start()
+    start_watch_folder()
+
+# Les processus de lecture des classeurs réimportent ce module : ils ne lancent pas les tâches de fond.
+if __name__ != '__mp_main__' and multiprocessing.parent_process() is None:
+    start_background_tasks()
 
 if __name__ == '__main__':
     app.run_server(debug=False)
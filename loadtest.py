@@ -0,0 +1,385 @@
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ORDER_STATUSES = ['Created', 'Order Approved', 'In Work', 'Waiting for Parts', 'Waiting for PO',
+                  'Suspended', 'Task Complete', 'Order Complete', 'Cancelled']
+ORDER_TYPES = ['Repair', 'Maintenance', 'Installation', 'Inspection', 'Warranty Claim', 'Calibration']
+PRODUCT_LINES = ['Dental Units', 'Imaging', 'Sterilisation', 'Handpieces', 'Compressors', 'Software']
+
+# Catégories cliquables par graphique de l'onglet 1 (filtrage croisé).
+CLICK_LABELS = {
+    'graph-order_type': ORDER_TYPES,
+    'graph-order_status': ORDER_STATUSES,
+    'graph-product_line': PRODUCT_LINES,
+    'graph-warranty_status': ['In Warranty', 'Out of Warranty'],
+    'graph-free_chargeable': ['Free', 'Chargeable'],
+}
+
+
+def synthetic_orders(rows, branch, seed):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.today().normalize()
+    created = now - pd.to_timedelta(rng.integers(0, 400, rows), unit='D')
+
+    def later(base, probability):
+        dates = base + pd.to_timedelta(rng.integers(0, 40, rows), unit='D')
+        dates = dates.where(dates <= now, now)
+        return dates.where(rng.random(rows) < probability)
+
+    approved = later(created, 0.8)
+    return pd.DataFrame({
+        'Order No.': [f"{branch}-{seed}-{i:07d}" for i in range(rows)],
+        'Customer Name': rng.choice([f"Client {i}" for i in range(200)], rows),
+        'Service Technician': rng.choice([f"Technicien {i}" for i in range(25)], rows),
+        'Model': rng.choice([f"Modèle {i}" for i in range(40)], rows),
+        'Order Status': rng.choice(ORDER_STATUSES, rows),
+        'Order Type': rng.choice(ORDER_TYPES, rows),
+        'Product Line': rng.choice(PRODUCT_LINES, rows),
+        'Warranty Status': rng.choice(['In Warranty', 'Out of Warranty'], rows),
+        'Free/Chargeable': rng.choice(['Free', 'Chargeable'], rows),
+        'Total net value': rng.gamma(2.0, 250.0, rows).round(2),
+        'Created At': created,
+        'Approved Date': approved,
+        'Task Completed Date': later(approved, 0.4),
+        'Order Completed Date': later(approved, 0.3),
+        'Waiting for PO At': later(created, 0.2),
+        'In Work At': later(approved, 0.5),
+        'Wf. Part At(H)': later(approved, 0.2),
+        'Suspension At': later(created, 0.05),
+    })
+
+
+def synthetic_agenda(employees, seed):
+    rng = np.random.default_rng(seed)
+    agenda = pd.DataFrame({'Nom': [f"Employé {i}" for i in range(employees)]})
+    for day in range(1, 29):
+        agenda[str(day)] = rng.choice(['P', 'A', 'C', ''], employees, p=[0.7, 0.1, 0.1, 0.1])
+    return agenda
+
+
+def as_upload(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return f"data:{XLSX_MIME};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def build_workbooks(rows, branches, seed):
+    orders = [as_upload(synthetic_orders(rows, f"Agence{i + 1}", seed + i)) for i in range(branches)]
+    filenames = [f"Agence{i + 1}.xlsx" for i in range(branches)]
+    return orders, filenames, as_upload(synthetic_agenda(30, seed))
+
+
+class InProcessClient:
+    # Appelle directement l'application WSGI de final.py via le client de test Flask.
+    def __init__(self):
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import final
+        self.client = final.app.server.test_client()
+
+    def get_json(self, path):
+        return self.client.get(path).get_json()
+
+    def post_json(self, path, payload):
+        response = self.client.post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def get_json(self, path):
+        with urllib.request.urlopen(self.url + path) as response:
+            return json.loads(response.read())
+
+    def post_json(self, path, payload):
+        request = urllib.request.Request(self.url + path, data=json.dumps(payload).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                body = response.read()
+                return response.status, json.loads(body) if body else None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def split_output(output):
+    # "..a.b...c.d.." (sorties multiples) ou "a.b"
+    multi = output.startswith('..')
+    parts = output[2:-2].split('...') if multi else [output]
+    return multi, [tuple(part.rsplit('.', 1)) for part in parts]
+
+
+def collect_ids(node, ids):
+    if isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict) and isinstance(props.get('id'), str):
+            ids.add(props['id'])
+        for value in node.values():
+            collect_ids(value, ids)
+    elif isinstance(node, list):
+        for value in node:
+            collect_ids(value, ids)
+    return ids
+
+
+def has_error_component(node):
+    # Les erreurs applicatives reviennent en HTTP 200 : final.py les affiche avec la classe 'dashboard-error'.
+    if isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict) and 'dashboard-error' in str(props.get('className', '')).split():
+            return True
+        return any(has_error_component(value) for value in node.values())
+    if isinstance(node, list):
+        return any(has_error_component(value) for value in node)
+    return False
+
+
+class Session:
+    # Reproduit le comportement du navigateur : état des propriétés, déclenchement des callbacks
+    # dépendants dans l'ordre du graphe, et composants présents dans la page.
+    def __init__(self, client, dependencies, static_ids, recorder, rng):
+        self.client = client
+        self.callbacks = []
+        for dep in dependencies:
+            multi, outputs = split_output(dep['output'])
+            self.callbacks.append({
+                'output': dep['output'],
+                'multi': multi,
+                'outputs': outputs,
+                'inputs': [(i['id'], i['property']) for i in dep['inputs']],
+                'state': [(s['id'], s['property']) for s in dep['state']],
+                'prevent_initial_call': dep.get('prevent_initial_call', False),
+            })
+        self.static_ids = static_ids
+        self.dynamic_ids = set()
+        self.props = {('tabs', 'value'): 'tab1', ('period-dropdown', 'value'): 'month', ('branch-dropdown', 'value'): []}
+        self.recorder = recorder
+        self.rng = rng
+
+    def mounted(self, callback):
+        ids = self.static_ids | self.dynamic_ids
+        return all(component_id in ids for component_id, _ in callback['outputs'])
+
+    def call(self, callback, changed):
+        payload = {
+            'output': callback['output'],
+            'outputs': [{'id': i, 'property': p} for i, p in callback['outputs']] if callback['multi']
+            else {'id': callback['outputs'][0][0], 'property': callback['outputs'][0][1]},
+            'inputs': [{'id': i, 'property': p, 'value': self.props.get((i, p))} for i, p in callback['inputs']],
+            'state': [{'id': i, 'property': p, 'value': self.props.get((i, p))} for i, p in callback['state']],
+            'changedPropIds': [f"{i}.{p}" for i, p in changed],
+        }
+        start = time.perf_counter()
+        try:
+            status, body = self.client.post_json('/_dash-update-component', payload)
+        except Exception:
+            status, body = None, None
+        response = (body or {}).get('response') or {}
+        self.recorder.record(callback['output'], time.perf_counter() - start, status, has_error_component(response))
+        updated = set()
+        for component_id, props in response.items():
+            for prop, value in props.items():
+                if isinstance(value, dict) and '__dash_patch_update' in value:
+                    updated.add((component_id, prop))
+                    continue
+                self.props[(component_id, prop)] = value
+                updated.add((component_id, prop))
+                if component_id == 'tabs-content' and prop == 'children':
+                    self.dynamic_ids = collect_ids(value, set())
+        return updated
+
+    def dispatch(self, changed, initial=False):
+        pending = {}
+        if initial:
+            for callback in self.callbacks:
+                if not callback['prevent_initial_call'] and self.mounted(callback):
+                    pending[callback['output']] = (callback, set())
+        self.trigger(pending, set(changed))
+        while pending:
+            # allow_duplicate suffixe la propriété de sortie par "@<hash>"
+            blocked = {(i, p.split('@')[0]) for callback, _ in pending.values() for i, p in callback['outputs']}
+            ready = [key for key, (callback, _) in pending.items()
+                     if not any(prop in blocked for prop in callback['inputs'])]
+            if not ready:
+                raise RuntimeError(f"Dépendance circulaire entre callbacks : {', '.join(pending)}")
+            for key in ready:
+                callback, callback_changed = pending.pop(key)
+                if not self.mounted(callback):
+                    continue
+                self.trigger(pending, self.call(callback, callback_changed))
+
+    def trigger(self, pending, changed):
+        for callback in self.callbacks:
+            hits = changed.intersection(callback['inputs'])
+            if hits and self.mounted(callback):
+                pending.setdefault(callback['output'], (callback, set()))[1].update(hits)
+
+    def set(self, component_id, prop, value):
+        self.props[(component_id, prop)] = value
+        self.dispatch({(component_id, prop)})
+
+    def run(self, workbooks, iterations):
+        orders, filenames, agenda = workbooks
+        self.dispatch(set(), initial=True)
+        self.props[('upload-data', 'filename')] = filenames
+        self.props[('upload-agenda', 'contents')] = agenda
+        self.set('upload-data', 'contents', orders)
+        for _ in range(iterations):
+            action = self.rng.choice(['tab', 'period', 'date', 'branch', 'click'])
+            if action == 'tab':
+                self.set('tabs', 'value', self.rng.choice(['tab1', 'tab2', 'tab3']))
+            elif action == 'period':
+                self.set('period-dropdown', 'value', self.rng.choice(['month', 'quarter', 'year']))
+            elif action == 'date':
+                options = self.props.get(('date-dropdown', 'options')) or []
+                if options:
+                    self.set('date-dropdown', 'value', self.rng.choice(options)['value'])
+            elif action == 'branch':
+                options = [o['value'] for o in self.props.get(('branch-dropdown', 'options')) or []]
+                branches = self.rng.sample(options, self.rng.randint(0, len(options))) if options else []
+                self.set('branch-dropdown', 'value', branches)
+            else:
+                graphs = [graph for graph in CLICK_LABELS if graph in self.dynamic_ids]
+                if 'cross-filter-reset' in self.dynamic_ids and self.rng.random() < 0.2:
+                    self.set('cross-filter-reset', 'n_clicks', (self.props.get(('cross-filter-reset', 'n_clicks')) or 0) + 1)
+                elif graphs:
+                    graph = self.rng.choice(graphs)
+                    self.set(graph, 'clickData', {'points': [{'label': self.rng.choice(CLICK_LABELS[graph])}]})
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def record(self, output, latency, status, app_error=False):
+        with self.lock:
+            self.samples.append((output, latency, status, app_error))
+
+
+def process_rss(pid):
+    if psutil is not None:
+        return psutil.Process(pid).memory_info().rss
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def sample_memory(pid, interval, stop, curve):
+    start = time.perf_counter()
+    while not stop.is_set():
+        curve.append((time.perf_counter() - start, process_rss(pid)))
+        stop.wait(interval)
+    curve.append((time.perf_counter() - start, process_rss(pid)))
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float('nan')
+
+
+def report(recorder, elapsed, curve, sessions, harness_rss=0):
+    samples = recorder.samples
+    latencies = [latency for _, latency, _, _ in samples]
+    http_errors = sum(1 for _, _, status, _ in samples if status is None or status >= 400)
+    app_errors = sum(1 for _, _, status, app_error in samples if app_error and status is not None and status < 400)
+    errors = http_errors + app_errors
+    print(f"\nSessions simultanées : {sessions}")
+    print(f"Requêtes : {len(samples)} en {elapsed:.1f} s -> {len(samples) / elapsed:.1f} req/s")
+    print(f"Erreurs : {errors} ({100 * errors / max(len(samples), 1):.2f} %) -> HTTP {http_errors}, applicatives {app_errors}")
+    print(f"Latence (ms) : p50 {percentile(latencies, 50):.0f}  p90 {percentile(latencies, 90):.0f}  "
+          f"p95 {percentile(latencies, 95):.0f}  p99 {percentile(latencies, 99):.0f}  max {max(latencies, default=0) * 1000:.0f}")
+
+    by_callback = defaultdict(list)
+    for output, latency, _, _ in samples:
+        by_callback[output].append(latency)
+    print("\nPar callback :")
+    for output, values in sorted(by_callback.items(), key=lambda item: -sum(item[1])):
+        print(f"  {output[:60]:<60} n={len(values):<6} p50 {percentile(values, 50):7.0f} ms  p95 {percentile(values, 95):7.0f} ms")
+
+    points = [(t, rss) for t, rss in curve if rss is not None]
+    if points:
+        if harness_rss:
+            # En processus, la mémoire mesurée contient aussi les classeurs base64 générés par le test.
+            print(f"\nMémoire RSS (en processus, classeurs synthétiques du test déduits : {harness_rss / 2 ** 20:.1f} Mo) :")
+        else:
+            print("\nMémoire RSS :")
+        points = [(t, rss - harness_rss) for t, rss in points]
+        step = max(len(points) // 20, 1)
+        for t, rss in points[::step] + ([points[-1]] if (len(points) - 1) % step else []):
+            print(f"  t={t:6.1f} s  {rss / 2 ** 20:8.1f} Mo")
+        print(f"  pic : {max(rss for _, rss in points) / 2 ** 20:.1f} Mo")
+    else:
+        print("\nMémoire RSS : indisponible (installer psutil ou préciser --pid)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test de charge des callbacks Dash de final.py.")
+    parser.add_argument('--url', help="serveur déjà lancé (ex. http://127.0.0.1:8050) ; par défaut, client de test Flask en processus")
+    parser.add_argument('--pid', type=int, help="PID du serveur pour suivre sa mémoire avec --url")
+    parser.add_argument('--sessions', type=int, default=10, help="nombre de sessions simultanées")
+    parser.add_argument('--iterations', type=int, default=20, help="actions par session après le chargement")
+    parser.add_argument('--rows', type=int, default=5000, help="lignes par classeur synthétique")
+    parser.add_argument('--branches', type=int, default=2, help="classeurs (agences) par session")
+    parser.add_argument('--distinct-uploads', action='store_true', help="un jeu de classeurs différent par session")
+    parser.add_argument('--sample-interval', type=float, default=0.5, help="intervalle d'échantillonnage RSS en secondes")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    client_factory = (lambda: HttpClient(args.url)) if args.url else InProcessClient
+    probe = client_factory()
+    dependencies = probe.get_json('/_dash-dependencies')
+    static_ids = collect_ids(probe.get_json('/_dash-layout'), set())
+
+    print("Génération des classeurs synthétiques...")
+    rss_before = None if args.url else process_rss(os.getpid())
+    shared = build_workbooks(args.rows, args.branches, args.seed)
+    workbooks = [build_workbooks(args.rows, args.branches, args.seed + 100 * i) if args.distinct_uploads else shared
+                 for i in range(args.sessions)]
+    rss_after = None if args.url else process_rss(os.getpid())
+    harness_rss = max(rss_after - rss_before, 0) if rss_before is not None and rss_after is not None else 0
+
+    recorder = Recorder()
+    curve = []
+    stop = threading.Event()
+    pid = args.pid if args.url else os.getpid()
+    sampler = threading.Thread(target=sample_memory, args=(pid, args.sample_interval, stop, curve), daemon=True)
+    if pid is not None:
+        sampler.start()
+
+    def run_session(index):
+        session = Session(client_factory(), dependencies, static_ids, recorder, random.Random(args.seed + index))
+        session.run(workbooks[index], args.iterations)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        list(executor.map(run_session, range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if sampler.is_alive():
+        sampler.join()
+    report(recorder, elapsed, curve, args.sessions, harness_rss)